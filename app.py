@@ -1,9 +1,16 @@
 import os
-from flask import Flask, render_template, request, jsonify
-from rag_backend import generate_answer
+from flask import Flask, render_template, request, jsonify, send_from_directory
+from rag_backend import generate_answer, list_tenants
+from intent_router import get_stats as get_intent_stats
+from suggest import suggest, get_index as get_suggest_index
+from query_log import log_query
+from profiling import maybe_profile, token_valid, list_profiles, PROFILE_DIR
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 
+# Build the suggestion index now so the first keystroke doesn't pay for it
+get_suggest_index()
+
 
 @app.route("/")
 def homepage():
@@ -17,10 +24,56 @@ def api_query():
     q = data.get("question", "").strip()
     if not q:
         return jsonify({"error": "Empty question"}), 400
-    result = generate_answer(q)
+    tenant = data.get("collection") or data.get("tenant")
+    if tenant and tenant not in list_tenants():
+        return jsonify({"error": f"Unknown collection '{tenant}'"}), 400
+    with maybe_profile("api_query", token=request.headers.get("X-Profile-Token")):
+        result = generate_answer(q, tenant=tenant)
+    log_query(
+        {
+            "question": q,
+            "tenant": tenant,
+            "intent": result.get("intent"),
+            "chunk_ids": result.get("chunk_ids", []),
+            "sources": len(result.get("sources", [])),
+            "answer": result.get("answer"),
+            "timings": result.get("timings", {}),
+        }
+    )
     return jsonify(result)
 
 
+@app.route("/api/suggest")
+def api_suggest():
+    """Autocomplete suggestions for a partially typed question."""
+    prefix = request.args.get("q", "")
+    limit = min(request.args.get("limit", 5, type=int), 10)
+    return jsonify({"suggestions": suggest(prefix, limit)})
+
+
+@app.route("/api/intent-stats")
+def api_intent_stats():
+    """How much traffic the intent fast path answers without RAG."""
+    return jsonify(get_intent_stats())
+
+
+@app.route("/api/profiles")
+def api_profiles():
+    """List the most recent request profiles (requires X-Profile-Token)."""
+    if not token_valid(request.headers.get("X-Profile-Token")):
+        return jsonify({"error": "Unauthorized"}), 401
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify({"profiles": list_profiles(limit)})
+
+
+@app.route("/api/profiles/<path:name>")
+def api_profile_file(name):
+    """Download one profile (requires X-Profile-Token)."""
+    if not token_valid(request.headers.get("X-Profile-Token")):
+        return jsonify({"error": "Unauthorized"}), 401
+    return send_from_directory(os.path.abspath(PROFILE_DIR), name, as_attachment=True)
+
+
 # # For local development, you can use the following line to run the Flask app so uncomment it on local mahine.
 # if __name__ == "__main__":
 #     app.run()
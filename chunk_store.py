@@ -0,0 +1,250 @@
+import json
+import mmap
+import os
+import shutil
+import sys
+import zlib
+from array import array
+from functools import lru_cache
+
+# A chunk store is a directory holding:
+#   blocks.bin   zlib-compressed blocks of up to BLOCK_RECORDS texts
+#   blocks.idx   uint64 start offset of each block in blocks.bin (+ end offset)
+#   records.idx  uint32 (block, offset, length) per record, into the decompressed block
+#   url.col      uint32 per record, index into url.dict
+#   heading.col  uint32 per record, index into heading.dict
+#   *.dict       JSON list of distinct values (dictionary-encoded columns)
+# Record ids are dense integers in insertion order. Index files are always
+# little-endian, so a store (or a copied persist_dir) reads the same on any host.
+BLOCK_RECORDS = 64  # Records per compressed block
+COMPRESS_LEVEL = 6
+BLOCK_CACHE = 32  # Decompressed blocks kept per open store
+COLUMNS = ("url", "heading")
+
+
+def _read_array(path, typecode):
+    arr = array(typecode)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            arr.frombytes(f.read())
+        if sys.byteorder == "big":
+            arr.byteswap()
+    return arr
+
+
+def _array_bytes(arr) -> bytes:
+    """Little-endian bytes of an array, whatever the host byte order."""
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _write_atomic(path, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read_dict(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ChunkStoreWriter:
+    """Streaming appender; records become visible to readers on flush()/close()."""
+
+    def __init__(self, path: str, overwrite: bool = False):
+        self.path = path
+        if overwrite and os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+
+        self.block_offsets = _read_array(os.path.join(path, "blocks.idx"), "Q")
+        if not self.block_offsets:
+            self.block_offsets.append(0)
+        self.records = _read_array(os.path.join(path, "records.idx"), "I")
+        self.columns = {}
+        self.dicts = {}
+        self.lookup = {}
+        for col in COLUMNS:
+            self.columns[col] = _read_array(os.path.join(path, f"{col}.col"), "I")
+            self.dicts[col] = _read_dict(os.path.join(path, f"{col}.dict"))
+            self.lookup[col] = {v: i for i, v in enumerate(self.dicts[col])}
+
+        # Drop any bytes written after the last indexed block (interrupted run)
+        self._data = open(os.path.join(path, "blocks.bin"), "ab")
+        self._data.truncate(self.block_offsets[-1])
+        self._pending = []
+
+    def __len__(self):
+        return len(self.records) // 3 + len(self._pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, text: str, url: str = "", heading: str = "") -> int:
+        """Add one record and return its id."""
+        record_id = len(self)
+        self._pending.append((text, {"url": url or "", "heading": heading or ""}))
+        if len(self._pending) >= BLOCK_RECORDS:
+            self._write_block()
+        return record_id
+
+    def _write_block(self):
+        if not self._pending:
+            return
+        block_no = len(self.block_offsets) - 1
+        parts = []
+        offset = 0
+        for text, meta in self._pending:
+            raw = text.encode("utf-8")
+            parts.append(raw)
+            self.records.extend((block_no, offset, len(raw)))
+            offset += len(raw)
+            for col in COLUMNS:
+                value = meta[col]
+                idx = self.lookup[col].get(value)
+                if idx is None:
+                    idx = self.lookup[col][value] = len(self.dicts[col])
+                    self.dicts[col].append(value)
+                self.columns[col].append(idx)
+
+        payload = zlib.compress(b"".join(parts), COMPRESS_LEVEL)
+        self._data.write(payload)
+        self.block_offsets.append(self.block_offsets[-1] + len(payload))
+        self._pending = []
+
+    def flush(self):
+        """Write buffered records and publish the updated indexes."""
+        self._write_block()
+        self._data.flush()
+        os.fsync(self._data.fileno())
+        for col in COLUMNS:
+            _write_atomic(os.path.join(self.path, f"{col}.col"), _array_bytes(self.columns[col]))
+            _write_atomic(
+                os.path.join(self.path, f"{col}.dict"),
+                json.dumps(self.dicts[col], ensure_ascii=False).encode("utf-8"),
+            )
+        _write_atomic(os.path.join(self.path, "records.idx"), _array_bytes(self.records))
+        # blocks.idx last: readers size the store from it
+        _write_atomic(os.path.join(self.path, "blocks.idx"), _array_bytes(self.block_offsets))
+
+    def close(self):
+        if self._data.closed:
+            return
+        self.flush()
+        self._data.close()
+
+
+def _block_loader(mm, block_offsets):
+    """
+    Cached block decompressor. It closes over the map and offsets rather than
+    the store, so a dropped store has no reference cycle and its mmap and file
+    are released as soon as the last user lets go of it.
+    """
+
+    @lru_cache(maxsize=BLOCK_CACHE)
+    def load(block_no: int) -> bytes:
+        start, end = block_offsets[block_no], block_offsets[block_no + 1]
+        return zlib.decompress(mm[start:end])
+
+    return load
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view of a chunk store with random access by id."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.block_offsets = _read_array(os.path.join(path, "blocks.idx"), "Q")
+        if not self.block_offsets:
+            raise FileNotFoundError(f"No chunk store at '{path}'")
+        records = _read_array(os.path.join(path, "records.idx"), "I")
+        # Ignore records whose block is not published yet (writer mid-flush)
+        count = len(records) // 3
+        while count and records[(count - 1) * 3] >= len(self.block_offsets) - 1:
+            count -= 1
+        self.count = count
+        self.records = records
+        self.columns = {
+            col: _read_array(os.path.join(path, f"{col}.col"), "I") for col in COLUMNS
+        }
+        self.dicts = {col: _read_dict(os.path.join(path, f"{col}.dict")) for col in COLUMNS}
+
+        self._file = open(os.path.join(path, "blocks.bin"), "rb")
+        size = self.block_offsets[-1]
+        self._mm = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+        self._block = _block_loader(self._mm, self.block_offsets)
+
+    def __len__(self):
+        return self.count
+
+    def text(self, record_id: int) -> str:
+        block_no, offset, length = self.records[record_id * 3 : record_id * 3 + 3]
+        return self._block(block_no)[offset : offset + length].decode("utf-8")
+
+    def meta(self, record_id: int) -> dict:
+        return {col: self.dicts[col][self.columns[col][record_id]] for col in COLUMNS}
+
+    def get(self, record_id: int) -> dict:
+        if not 0 <= record_id < self.count:
+            raise IndexError(record_id)
+        return {"id": record_id, "text": self.text(record_id), **self.meta(record_id)}
+
+    def get_many(self, record_ids):
+        return [self.get(i) for i in record_ids]
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.get(i)
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+
+def exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, "blocks.idx"))
+
+
+def iter_records(store_path: str, legacy_jsonl: str = None):
+    """Yield dicts from a chunk store, falling back to a legacy JSONL file."""
+    if exists(store_path):
+        store = ChunkStore(store_path)
+        try:
+            yield from store
+        finally:
+            store.close()
+    elif legacy_jsonl and os.path.exists(legacy_jsonl):
+        print(f"[INFO] {store_path} not found, reading legacy {legacy_jsonl}")
+        with open(legacy_jsonl, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    else:
+        raise FileNotFoundError(store_path)
+
+
+def convert_jsonl(jsonl_path: str, store_path: str) -> int:
+    """Convert a {url, text[, heading]} JSONL file into a chunk store."""
+    with ChunkStoreWriter(store_path, overwrite=True) as writer:
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                d = json.loads(line)
+                writer.append(d.get("text", ""), d.get("url", ""), d.get("heading", ""))
+        return len(writer)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python chunk_store.py <input.jsonl> <output store dir>")
+        sys.exit(1)
+    n = convert_jsonl(sys.argv[1], sys.argv[2])
+    print(f"[DONE] Converted {n} records -> {sys.argv[2]}")
@@ -1,11 +1,21 @@
+import argparse
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse, urlunparse
 import time
 import json
-from collections import deque
+import os
+import re
+import shutil
+import heapq
+import itertools
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
 import urllib.robotparser
 from tqdm import tqdm
+from profiling import maybe_profile
+from chunk_store import ChunkStoreWriter
+from tenants import DEFAULT_TENANT, tenant_settings
 
 # Try to import selenium for JavaScript rendering
 try:
@@ -44,13 +54,37 @@ HEADERS = {
     "Sec-Fetch-User": "?1",
     "Cache-Control": "max-age=0",
 }
+ROOT_URL = "https://ismt.edu.np/"  # Default tenant's site; others set root_url
 MAX_PAGES = 0  # 0 = no limit, crawl all pages
 REQUEST_DELAY = 0.5  # seconds - reduced for faster crawling
-OUTPUT_FILE = "crawled_pages.jsonl"
+OUTPUT_FILE = "crawled_pages.store"  # Chunk store directory (see chunk_store.py), in the tenant's data_dir
 MIN_TEXT_LENGTH = 100
 DEBUG = True
 USE_SELENIUM = True  # Set to True to use headless browser for JavaScript content
 
+# Frontier settings
+MAX_DEPTH = 6  # Link hops from the root or a sitemap entry
+CHECKPOINT_FILE = "crawl_state.json"  # Frontier/seen-set checkpoint for resuming
+CHECKPOINT_EVERY = 20  # Pages between checkpoints
+USE_SITEMAP = True
+# Sections fetched first (lower is better); unmatched paths get DEFAULT_SECTION_PRIORITY
+SECTION_PRIORITY = {
+    r"^/(admission|admissions)": 0,
+    r"^/(program|programs|course|courses)": 0,
+    r"^/(about|contact|fee|fees|scholarship)": 1,
+    r"^/(news|events|blog|notice)": 3,
+}
+DEFAULT_SECTION_PRIORITY = 2
+# Only URLs matching an include rule (if any) and no exclude rule are queued
+INCLUDE_PATTERNS = []
+EXCLUDE_PATTERNS = [
+    r"[?&](page|paged|p)=\d+",  # pagination traps
+    r"/page/\d+",
+    r"/(tag|author|feed|wp-json|wp-admin)(/|$)",
+    r"[?&](replytocom|share|utm_[a-z]+)=",
+    r"\.(pdf|jpe?g|png|gif|svg|zip|docx?|xlsx?|pptx?|mp4|mp3)$",
+]
+
 
 def is_same_domain(root, url):
     root_parsed = urlparse(root)
@@ -76,6 +110,174 @@ def normalize_url(url):
     return urlunparse((scheme, netloc, path, "", query, ""))
 
 
+def is_allowed_url(url):
+    """Apply INCLUDE_PATTERNS / EXCLUDE_PATTERNS to a normalized URL."""
+    if INCLUDE_PATTERNS and not any(re.search(p, url) for p in INCLUDE_PATTERNS):
+        return False
+    return not any(re.search(p, url, re.IGNORECASE) for p in EXCLUDE_PATTERNS)
+
+
+def url_priority(url, depth, lastmod=None):
+    """Lower sorts first: shallow pages in important sections, freshest first."""
+    path = urlparse(url).path or "/"
+    section = DEFAULT_SECTION_PRIORITY
+    for pattern, prio in SECTION_PRIORITY.items():
+        if re.search(pattern, path, re.IGNORECASE):
+            section = prio
+            break
+    age_days = 365.0
+    if lastmod:
+        try:
+            modified = datetime.fromisoformat(lastmod.replace("Z", "+00:00"))
+            if modified.tzinfo is None:
+                modified = modified.replace(tzinfo=timezone.utc)
+            age_days = max((datetime.now(timezone.utc) - modified).days, 0)
+        except ValueError:
+            pass
+    return (depth, section, min(age_days, 365.0))
+
+
+class Frontier:
+    """Priority queue of (priority, url, depth) with a seen set, checkpointable to disk."""
+
+    def __init__(self):
+        self.heap = []
+        self.seen = set()
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, url, depth, lastmod=None):
+        if url in self.seen or depth > MAX_DEPTH or not is_allowed_url(url):
+            return False
+        self.seen.add(url)
+        prio = url_priority(url, depth, lastmod)
+        heapq.heappush(self.heap, (prio, next(self._counter), url, depth))
+        return True
+
+    def requeue(self, url, depth):
+        """Push back an already-seen URL whose fetch did not complete."""
+        prio = url_priority(url, depth)
+        heapq.heappush(self.heap, (prio, next(self._counter), url, depth))
+
+    def pop(self):
+        _, _, url, depth = heapq.heappop(self.heap)
+        return url, depth
+
+    def to_dict(self):
+        return {
+            "queue": [[list(p), url, depth] for p, _, url, depth in self.heap],
+            "seen": sorted(self.seen),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        frontier = cls()
+        frontier.seen = set(data.get("seen", []))
+        for prio, url, depth in data.get("queue", []):
+            frontier.heap.append((tuple(prio), next(frontier._counter), url, depth))
+        heapq.heapify(frontier.heap)
+        return frontier
+
+
+def save_checkpoint(root, frontier, writer, skipped_reasons, checkpoint_file=CHECKPOINT_FILE):
+    """
+    Publish the pages written so far and save the frontier and seen set
+    atomically, so an interrupted crawl can resume. Page texts live only in
+    the partial chunk store, never in the checkpoint.
+    """
+    writer.flush()
+    state = {
+        "root": root,
+        "frontier": frontier.to_dict(),
+        "pages": len(writer),
+        "skipped_reasons": skipped_reasons,
+    }
+    tmp = f"{checkpoint_file}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, checkpoint_file)
+
+
+def load_checkpoint(root, checkpoint_file=CHECKPOINT_FILE):
+    """Return saved (frontier, page count, skipped_reasons) for `root`, or None."""
+    if not os.path.exists(checkpoint_file):
+        return None
+    try:
+        with open(checkpoint_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except Exception as e:
+        print(f"[WARNING] Ignoring unreadable checkpoint {checkpoint_file}: {e}")
+        return None
+    if state.get("root") != root or "pages" not in state:
+        return None
+    return (
+        Frontier.from_dict(state.get("frontier", {})),
+        state["pages"],
+        state.get("skipped_reasons", {}),
+    )
+
+
+def remove_checkpoint(checkpoint_file=CHECKPOINT_FILE):
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+
+def fetch_sitemap_urls(root, rp=None):
+    """
+    Collect (url, lastmod) pairs from the site's sitemaps.
+    Sitemap locations come from robots.txt, falling back to /sitemap.xml;
+    sitemap indexes are followed recursively.
+    """
+    sitemaps = []
+    if rp is not None:
+        try:
+            sitemaps = list(rp.site_maps() or [])
+        except Exception:
+            sitemaps = []
+    if not sitemaps:
+        sitemaps = [urljoin(root, "/sitemap.xml")]
+
+    entries = {}
+    pending = list(sitemaps)
+    visited = set()
+    while pending:
+        sm_url = pending.pop()
+        if sm_url in visited:
+            continue
+        visited.add(sm_url)
+        try:
+            resp = requests.get(sm_url, headers=HEADERS, timeout=30)
+            if resp.status_code != 200:
+                continue
+            tree = ET.fromstring(resp.content)
+        except Exception as e:
+            if DEBUG:
+                print(f"[DEBUG] Could not read sitemap {sm_url}: {str(e)[:80]}")
+            continue
+
+        # Strip XML namespaces so tag checks stay simple
+        for elem in tree.iter():
+            if "}" in elem.tag:
+                elem.tag = elem.tag.split("}", 1)[1]
+
+        if tree.tag == "sitemapindex":
+            for sm in tree.findall("sitemap"):
+                loc = (sm.findtext("loc") or "").strip()
+                if loc:
+                    pending.append(loc)
+        else:
+            for u in tree.findall("url"):
+                loc = (u.findtext("loc") or "").strip()
+                if loc:
+                    entries[normalize_url(loc)] = (u.findtext("lastmod") or "").strip() or None
+
+    if DEBUG:
+        print(f"[DEBUG] Sitemaps read: {len(visited)}, URLs found: {len(entries)}")
+    return list(entries.items())
+
+
 def get_robots_parser(root):
     rp = urllib.robotparser.RobotFileParser()
     robots_url = urljoin(root, "/robots.txt")
@@ -135,6 +337,13 @@ def extract_visible_text(html):
     return "\n".join(texts)
 
 
+def extract_heading(html):
+    """Page heading for suggestions: first <h1>, else the <title>."""
+    soup = BeautifulSoup(html, "html.parser")
+    tag = soup.find("h1") or soup.find("title")
+    return tag.get_text(separator=" ", strip=True) if tag else ""
+
+
 def get_page_content(url, driver=None, use_selenium_flag=True):
     """Get page content - uses Selenium if available and enabled, otherwise falls back to requests"""
 
@@ -165,10 +374,33 @@ def get_page_content(url, driver=None, use_selenium_flag=True):
             return None, False
 
 
-def crawl(root):
+def crawl(root, resume=True, output_file=OUTPUT_FILE, checkpoint_file=CHECKPOINT_FILE):
     root = normalize_url(root)
     rp = get_robots_parser(root)
 
+    # Pages stream into a partial store that replaces output_file only when
+    # the crawl finishes, so an interrupted crawl never clobbers the last one
+    partial_file = f"{output_file}.partial"
+    checkpoint = load_checkpoint(root, checkpoint_file) if resume else None
+    writer = None
+    if checkpoint:
+        frontier, pages, saved_reasons = checkpoint
+        writer = ChunkStoreWriter(partial_file)
+        if len(writer) != pages:
+            print("[WARNING] Checkpoint does not match the partial store, starting over")
+            writer.close()
+            writer = None
+        else:
+            print(f"[INFO] Resuming crawl: {pages} pages saved, {len(frontier)} queued")
+    if writer is None:
+        writer = ChunkStoreWriter(partial_file, overwrite=True)
+        frontier, saved_reasons = Frontier(), {}
+        frontier.push(root, 0)
+        if USE_SITEMAP:
+            for loc, lastmod in fetch_sitemap_urls(root, rp):
+                if is_same_domain(root, loc):
+                    frontier.push(loc, 0, lastmod)
+
     # Initialize Selenium driver if available
     driver = None
     use_selenium = False
@@ -219,17 +451,13 @@ def crawl(root):
                 "[INFO] Falling back to requests-only mode (JavaScript content may be missing)"
             )
 
-    q = deque([root])
-    seen = set([root])
-    results = []
-
     if DEBUG:
         print(f"[DEBUG] Starting crawl from: {root}")
         print(f"[DEBUG] Using Selenium: {use_selenium}")
 
     pbar = tqdm(
         total=MAX_PAGES if MAX_PAGES > 0 else None,
-        desc="Crawling ISMT site",
+        desc=f"Crawling {urlparse(root).netloc}",
         unit="page",
     )
     skipped_reasons = {
@@ -240,88 +468,142 @@ def crawl(root):
         "exception": 0,
         "no_driver": 0,
     }
+    skipped_reasons.update(saved_reasons)
+    pbar.update(len(writer))
+    processed = 0
+    current = None  # Page being fetched, requeued if the crawl is interrupted
+    interrupted = False
 
-    while q:
-        url = q.popleft()
+    try:
+        while frontier:
+            if MAX_PAGES > 0 and len(writer) >= MAX_PAGES:
+                break
+            if processed and processed % CHECKPOINT_EVERY == 0:
+                save_checkpoint(root, frontier, writer, skipped_reasons, checkpoint_file)
+            url, depth = current = frontier.pop()
+            processed += 1
+
+            try:
+                html_content, success = get_page_content(url, driver, use_selenium)
+
+                if not success or html_content is None:
+                    pbar.update(1)
+                    skipped_reasons["status"] += 1
+                    continue
 
-        try:
-            html_content, success = get_page_content(url, driver, use_selenium)
+                # Check for redirect - if redirected to different domain, skip
+                if driver:
+                    final_url = driver.current_url
+                else:
+                    final_url = url
 
-            if not success or html_content is None:
-                pbar.update(1)
-                skipped_reasons["status"] += 1
-                continue
+                if not is_same_domain(root, final_url):
+                    if DEBUG:
+                        print(
+                            f"[DEBUG] Redirected to different domain: {url} -> {final_url}"
+                        )
+                    pbar.update(1)
+                    skipped_reasons["status"] += 1
+                    continue
 
-            # Check for redirect - if redirected to different domain, skip
-            if driver:
-                final_url = driver.current_url
-            else:
-                final_url = url
+                text = extract_visible_text(html_content)
 
-            if not is_same_domain(root, final_url):
+                # More lenient text length check
+                if len(text.strip()) < MIN_TEXT_LENGTH:
+                    if DEBUG:
+                        print(
+                            f"[DEBUG] Text too short for {url}: {len(text.strip())} chars"
+                        )
+                    pbar.update(1)
+                    skipped_reasons["too_short"] += 1
+                    continue
+
+                writer.append(text, url, extract_heading(html_content))
                 if DEBUG:
-                    print(
-                        f"[DEBUG] Redirected to different domain: {url} -> {final_url}"
-                    )
+                    print(f"[DEBUG] Saved page: {url} ({len(text)} chars)")
                 pbar.update(1)
-                skipped_reasons["status"] += 1
-                continue
 
-            text = extract_visible_text(html_content)
-
-            # More lenient text length check
-            if len(text.strip()) < MIN_TEXT_LENGTH:
+                soup = BeautifulSoup(html_content, "html.parser")
+                for a in soup.find_all("a", href=True):
+                    href = a["href"].split("#")[0]
+                    # Skip empty hrefs
+                    if not href or href in ["", "/"]:
+                        continue
+                    joined = urljoin(url, href)
+                    norm = normalize_url(joined)
+                    if is_same_domain(root, norm):
+                        frontier.push(norm, depth + 1)
+
+            except Exception as e:
                 if DEBUG:
-                    print(
-                        f"[DEBUG] Text too short for {url}: {len(text.strip())} chars"
-                    )
+                    print(f"[DEBUG] Exception for {url}: {str(e)[:100]}")
                 pbar.update(1)
-                skipped_reasons["too_short"] += 1
-                continue
-
-            results.append({"url": url, "text": text})
-            if DEBUG:
-                print(f"[DEBUG] Saved page: {url} ({len(text)} chars)")
-            pbar.update(1)
-
-            soup = BeautifulSoup(html_content, "html.parser")
-            for a in soup.find_all("a", href=True):
-                href = a["href"].split("#")[0]
-                # Skip empty hrefs
-                if not href or href in ["", "/"]:
-                    continue
-                joined = urljoin(url, href)
-                norm = normalize_url(joined)
-                if norm not in seen and is_same_domain(root, norm):
-                    seen.add(norm)
-                    q.append(norm)
-
-        except Exception as e:
-            if DEBUG:
-                print(f"[DEBUG] Exception for {url}: {str(e)[:100]}")
-            pbar.update(1)
-            skipped_reasons["exception"] += 1
-            continue
-    pbar.close()
-
-    # Clean up driver
-    if driver:
-        try:
-            driver.quit()
-        except:
-            pass
+                skipped_reasons["exception"] += 1
+            finally:
+                current = None
+
+    except KeyboardInterrupt:
+        interrupted = True
+        # Put the unfinished page back so a resumed crawl fetches it
+        if current is not None:
+            frontier.requeue(*current)
+        print("\n[INFO] Crawl interrupted, saving progress...")
+        save_checkpoint(root, frontier, writer, skipped_reasons, checkpoint_file)
+    finally:
+        pbar.close()
+        # Clean up driver
+        if driver:
+            try:
+                driver.quit()
+            except:
+                pass
 
     if DEBUG:
         print(f"[DEBUG] Skipped reasons: {skipped_reasons}")
-        print(f"[DEBUG] Total URLs seen: {len(seen)}")
-        print(f"[DEBUG] Queue remaining: {len(q)}")
-
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        for r in results:
-            json.dump(r, f, ensure_ascii=False)
-            f.write("\n")
-    print(f"[DONE] Saved {len(results)} pages to {OUTPUT_FILE}")
+        print(f"[DEBUG] Total URLs seen: {len(frontier.seen)}")
+        print(f"[DEBUG] Queue remaining: {len(frontier)}")
+
+    if interrupted:
+        writer.close()
+        print(f"[INFO] {len(writer)} pages kept; re-run to resume the crawl")
+        return
+
+    # Finished (frontier exhausted or MAX_PAGES hit): publish and start fresh next time
+    writer.close()
+    if os.path.isdir(output_file):
+        shutil.rmtree(output_file)
+    os.replace(partial_file, output_file)
+    remove_checkpoint(checkpoint_file)
+    print(f"[DONE] Saved {len(writer)} pages to {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl a tenant's website into a chunk store.")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="Tenant key from tenants.json")
+    parser.add_argument("--root", help="Start URL (default: the tenant's root_url)")
+    parser.add_argument("--output", help=f"Output store (default: <data_dir>/{OUTPUT_FILE})")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any saved checkpoint")
+    args = parser.parse_args()
+
+    default_root = ROOT_URL if args.tenant == DEFAULT_TENANT else None
+    try:
+        config = tenant_settings(args.tenant, {"root_url": default_root})
+    except ValueError as e:
+        parser.error(str(e))
+    root = args.root or config["root_url"]
+    if not root:
+        parser.error(f"No root_url for tenant '{args.tenant}'; set it in tenants.json or pass --root")
+
+    data_dir = config["data_dir"]
+    os.makedirs(data_dir, exist_ok=True)
+    with maybe_profile("crawl_site", always=True):
+        crawl(
+            root,
+            resume=not args.no_resume,
+            output_file=args.output or os.path.join(data_dir, OUTPUT_FILE),
+            checkpoint_file=os.path.join(data_dir, CHECKPOINT_FILE),
+        )
 
 
 if __name__ == "__main__":
-    crawl("https://ismt.edu.np/")
+    main()
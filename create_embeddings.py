@@ -1,50 +1,55 @@
-import json
+import argparse
+import os
+import shutil
 from pathlib import Path
 from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
 import time
+from index_versions import new_version_name, write_current, garbage_collect
+from profiling import maybe_profile
+from chunk_store import ChunkStore, exists as store_exists, iter_records
+from tenants import DEFAULT_TENANT, tenant_settings
 
-CHUNKS_FILE = "chunks.jsonl"
+CHUNKS_FILE = "chunks.store"  # In the tenant's data_dir (see tenants.py)
+LEGACY_CHUNKS_FILE = "chunks.jsonl"  # Read if CHUNKS_FILE does not exist yet
 PERSIST_DIR = "chroma_db"
+COLLECTION_NAME = "ismt_docs"
 MODEL_NAME = (
     "sentence-transformers/all-MiniLM-L6-v2"  # Cloud-based sentence transformer model
 )
 
 
-def main():
+def main(
+    chunks_file=CHUNKS_FILE,
+    persist_dir=PERSIST_DIR,
+    collection_name=COLLECTION_NAME,
+    legacy_chunks_file=LEGACY_CHUNKS_FILE,
+):
     # Load the embedding model
     model = SentenceTransformer(MODEL_NAME)
 
     # Initialize Chroma client with persistence directory
     settings = Settings(
-        persist_directory=PERSIST_DIR, anonymized_telemetry=False, is_persistent=True
+        persist_directory=persist_dir, anonymized_telemetry=False, is_persistent=True
     )
     client = chromadb.Client(settings)
 
-    print(f"[INFO] ChromaDB client initialized with persistence to: {PERSIST_DIR}")
-
-    # Get or create collection
-    try:
-        collection = client.get_collection("ismt_docs")
-    except Exception:
-        collection = client.create_collection("ismt_docs")
+    print(f"[INFO] ChromaDB client initialized with persistence to: {persist_dir}")
 
     # Check if chunks file exists
-    if not Path(CHUNKS_FILE).exists():
-        print(f"ERROR: {CHUNKS_FILE} not found.")
+    if not Path(chunks_file).exists() and not Path(legacy_chunks_file).exists():
+        print(f"ERROR: {chunks_file} not found.")
         return
 
     # Load documents and metadata
     documents = []
     metadatas = []
     ids = []
-    with open(CHUNKS_FILE, "r", encoding="utf-8") as f:
-        for i, line in enumerate(f):
-            d = json.loads(line)
-            ids.append(str(i))
-            documents.append(d["text"])
-            metadatas.append({"url": d.get("url", "")})
+    for i, d in enumerate(iter_records(chunks_file, legacy_chunks_file)):
+        ids.append(str(i))
+        documents.append(d["text"])
+        metadatas.append({"url": d.get("url", "")})
 
     print(f"Generating embeddings for {len(documents)} chunks with {MODEL_NAME}...")
     t0 = time.time()
@@ -52,19 +57,32 @@ def main():
     t1 = time.time()
     print(f"Embeddings done in {t1 - t0:.1f}s")
 
-    # Delete old embeddings if any
-    try:
-        collection.delete(delete_all=True)
-    except Exception:
-        pass
+    # Build a fresh version next to the live one; running workers keep
+    # serving the current version until the pointer is flipped below
+    version = new_version_name(collection_name)
+
+    # Chunk text lives in a per-version snapshot of the chunk store, so Chroma
+    # only keeps embeddings and ids; without a store, texts go into Chroma
+    # The metadata path is relative to persist_dir so the index can be served
+    # from any working directory or after copying persist_dir elsewhere
+    chunk_snapshot = None
+    if store_exists(chunks_file):
+        chunk_dir = f"{version}.chunks"
+        chunk_snapshot = str(Path(persist_dir) / chunk_dir)
+        shutil.copytree(chunks_file, chunk_snapshot)
+    collection = client.create_collection(
+        version, metadata={"chunk_store": chunk_dir} if chunk_snapshot else None
+    )
+    print(f"[INFO] Building index version '{version}'")
 
     # Add embeddings in batches
     BATCH = 256
     for i in range(0, len(documents), BATCH):
         batch_ids = ids[i : i + BATCH]
-        batch_docs = documents[i : i + BATCH]
+        batch_docs = None if chunk_snapshot else documents[i : i + BATCH]
         batch_emb = embeddings[i : i + BATCH].tolist()
-        batch_meta = metadatas[i : i + BATCH]
+        # With a chunk store, urls and headings are read from it, not Chroma
+        batch_meta = None if chunk_snapshot else metadatas[i : i + BATCH]
         collection.add(
             ids=batch_ids,
             documents=batch_docs,
@@ -72,9 +90,70 @@ def main():
             metadatas=batch_meta,
         )
 
+    # Validate before going live
+    if not validate_version(collection, len(documents), embeddings, chunk_snapshot):
+        client.delete_collection(version)
+        if chunk_snapshot:
+            shutil.rmtree(chunk_snapshot, ignore_errors=True)
+        print(f"[ERROR] Validation failed, '{version}' discarded; live index unchanged.")
+        return
+
     # [INFO] Persistence is automatic, no need to call client.persist()
-    print(f"[DONE] Stored embeddings in Chroma persistent directory: {PERSIST_DIR}")
+    write_current(persist_dir, collection_name, version)
+    print(f"[OK] '{collection_name}' now points to '{version}'")
+    garbage_collect(client, persist_dir, collection_name)
+    print(f"[DONE] Stored embeddings in Chroma persistent directory: {persist_dir}")
+
+
+def validate_version(collection, expected_count, embeddings, chunk_snapshot=None):
+    """Check the new version is complete and answers a query with itself."""
+    count = collection.count()
+    if count != expected_count or count == 0:
+        print(f"[WARN] Expected {expected_count} items, found {count}")
+        return False
+    if chunk_snapshot:
+        store = ChunkStore(chunk_snapshot)
+        stored = len(store)
+        store.close()
+        if stored != expected_count:
+            print(f"[WARN] Chunk store has {stored} records, expected {expected_count}")
+            return False
+    res = collection.query(
+        query_embeddings=[embeddings[0].tolist()], n_results=1, include=["distances"]
+    )
+    distances = res.get("distances", [[]])[0]
+    if not distances or distances[0] > 1e-3:
+        print("[WARN] Self-query did not return the probed chunk")
+        return False
+    return True
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Embed a tenant's chunks into a new index version.")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="Tenant key from tenants.json")
+    parser.add_argument("--chunks", help=f"Chunk store to embed (default: <data_dir>/{CHUNKS_FILE})")
+    parser.add_argument("--persist-dir", help="ChromaDB directory (default: the tenant's persist_dir)")
+    parser.add_argument("--collection", help="Base collection name (default: the tenant's collection)")
+    args = parser.parse_args()
+    defaults = {"persist_dir": PERSIST_DIR, "collection": COLLECTION_NAME}
+    try:
+        config = tenant_settings(args.tenant, defaults)
+    except ValueError as e:
+        parser.error(str(e))
+    persist_dir = args.persist_dir or config["persist_dir"]
+    collection_name = args.collection or config["collection"]
+    # Never let another tenant's build replace the default index
+    if args.tenant != DEFAULT_TENANT and (persist_dir, collection_name) == (
+        PERSIST_DIR,
+        COLLECTION_NAME,
+    ):
+        parser.error(f"Tenant '{args.tenant}' needs its own persist_dir or collection in tenants.json")
+
+    data_dir = config["data_dir"]
+    with maybe_profile("create_embeddings", always=True):
+        main(
+            args.chunks or os.path.join(data_dir, CHUNKS_FILE),
+            persist_dir,
+            collection_name,
+            os.path.join(data_dir, LEGACY_CHUNKS_FILE),
+        )
@@ -0,0 +1,82 @@
+import os
+import re
+import secrets
+import shutil
+import time
+
+# A versioned index is a Chroma collection named "<base>_v<timestamp>_<random>".
+# The live version is recorded in "<persist_dir>/<base>.current", which is
+# replaced atomically so readers never see a half-written pointer.
+KEEP_VERSIONS = 2  # Live version plus the previous one for in-flight queries
+
+
+def pointer_path(persist_dir: str, base: str) -> str:
+    return os.path.join(persist_dir, f"{base}.current")
+
+
+def new_version_name(base: str) -> str:
+    """Sortable, unique name; microseconds plus a random suffix avoid collisions."""
+    now = time.time()
+    stamp = time.strftime("%Y%m%d%H%M%S", time.localtime(now))
+    micros = int(now * 1_000_000) % 1_000_000
+    return f"{base}_v{stamp}{micros:06d}_{secrets.token_hex(2)}"
+
+
+def read_current(persist_dir: str, base: str):
+    """Return (collection name, pointer mtime); falls back to the base name."""
+    path = pointer_path(persist_dir, base)
+    try:
+        mtime = os.path.getmtime(path)
+        with open(path, "r", encoding="utf-8") as f:
+            name = f.read().strip()
+        return (name or base), mtime
+    except OSError:
+        return base, None
+
+
+def write_current(persist_dir: str, base: str, name: str):
+    """Atomically point `base` at collection `name`."""
+    os.makedirs(persist_dir, exist_ok=True)
+    path = pointer_path(persist_dir, base)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def is_version_of(name: str, base: str) -> bool:
+    """
+    Exact match on the new_version_name() format (or the older
+    seconds-only one), so with a shared persist_dir "docs" never claims
+    "docs_vocational_v..." versions.
+    """
+    pattern = rf"{re.escape(base)}_v\d{{14}}(\d{{6}}_[0-9a-f]{{4}})?"
+    return re.fullmatch(pattern, name) is not None
+
+
+def list_versions(client, base: str):
+    """Names of all versioned collections for `base`, oldest first."""
+    names = []
+    for c in client.list_collections():
+        # Older chromadb returns Collection objects, newer returns names
+        name = getattr(c, "name", c)
+        if is_version_of(name, base):
+            names.append(name)
+    return sorted(names)
+
+
+def garbage_collect(client, persist_dir: str, base: str, keep: int = KEEP_VERSIONS):
+    """Drop old versions of `base`, never touching the live one."""
+    current, _ = read_current(persist_dir, base)
+    versions = [n for n in list_versions(client, base) if n != current]
+    stale = versions[: max(len(versions) - (keep - 1), 0)]
+    for name in stale:
+        try:
+            client.delete_collection(name)
+            shutil.rmtree(os.path.join(persist_dir, f"{name}.chunks"), ignore_errors=True)
+            print(f"[INFO] Deleted old index version '{name}'")
+        except Exception as e:
+            print(f"[WARN] Could not delete index version '{name}': {e}")
+    return stale
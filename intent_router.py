@@ -0,0 +1,182 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+from math import sqrt
+from suggest import within_one_edit
+
+# ---------------- CONFIG ----------------
+# Optional extra/overriding intents for the default tenant, same shape as
+# DEFAULT_INTENTS, e.g.
+# {"contact": {"patterns": ["contact (number|no|details)"],
+#              "examples": ["phone number", "how to contact you"],
+#              "answer": "You can reach ISMT College at ...",
+#              "sources": ["<a href=\"https://ismt.edu.np/\" target=\"_blank\">https://ismt.edu.np/</a>"]}}
+INTENTS_FILE = os.getenv("INTENTS_FILE", "intents.json")
+MAX_WORDS = 6  # Longer messages are real questions, always sent to RAG
+MATCH_THRESHOLD = 0.55  # Min trigram cosine similarity for a fuzzy match
+FUZZY_MIN_WORD = 3  # Shorter words must match an example word exactly
+
+# Each intent has anchored regex rules, example utterances for the
+# nearest-neighbour lookup, and a canned answer. Factual intents such as
+# contact details are left to RAG unless INTENTS_FILE provides an answer.
+# The built-ins speak for ISMT, so other tenants only get a fast path from
+# their own "intents_file" (see route()).
+DEFAULT_INTENTS = {
+    "greeting": {
+        "patterns": [r"(hi+|hello+|hey+|namaste|good (morning|afternoon|evening))"],
+        "examples": ["hi", "hello", "hey there", "namaste", "good morning"],
+        "answer": "Hello! I'm the ISMT College assistant. Ask me about programs, admissions, fees or campus life.",
+    },
+    "thanks": {
+        "patterns": [r"(thanks?( you| u)?( so much| a lot)?|thx|ty|dhanyabad|dhanyavad)"],
+        "examples": ["thanks", "thank you", "thank you so much", "thanks a lot", "thank you very much"],
+        "answer": "You're welcome! Let me know if you have any other questions about ISMT College.",
+    },
+    "goodbye": {
+        "patterns": [r"(bye+|goodbye|see you|see ya)"],
+        "examples": ["bye", "goodbye", "see you later"],
+        "answer": "Goodbye! Feel free to come back any time you have questions about ISMT College.",
+    },
+    "identity": {
+        "patterns": [r"(who|what) are you", r"what is your name"],
+        "examples": ["who are you", "what are you", "what is your name", "are you a bot"],
+        "answer": "I'm the ISMT College virtual assistant. I answer questions using information from the official ISMT College website.",
+    },
+}
+
+# ---------------- GLOBALS ----------------
+# Intents file (None = built-ins plus INTENTS_FILE) -> (intents, index, vocab)
+# where index holds (intent name, trigram vector, vector norm) and vocab maps
+# intent name -> words used in its examples
+_tables = {}
+_tables_lock = threading.Lock()
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _normalize(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def _trigrams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def load_intents(intents_file: str = None):
+    """
+    Build the lookup table for one intents file. With no file, the built-in
+    intents merged with INTENTS_FILE are used; a tenant's own file is used alone.
+    """
+    intents = {}
+    path = intents_file
+    if intents_file is None:
+        intents = {name: dict(spec) for name, spec in DEFAULT_INTENTS.items()}
+        path = INTENTS_FILE
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                intents.update(json.load(f))
+            print(f"[OK] Loaded intents from '{path}'.")
+        except Exception as e:
+            print(f"[WARN] Could not load '{path}': {e}")
+
+    # Intents without an answer (e.g. a disabled default) are not routed
+    intents = {name: spec for name, spec in intents.items() if spec and spec.get("answer")}
+
+    index = []
+    vocab = {}
+    for name, spec in intents.items():
+        spec["_regex"] = []
+        for p in spec.get("patterns", []):
+            try:
+                spec["_regex"].append(re.compile(rf"^(?:{p})$", re.IGNORECASE))
+            except re.error as e:
+                print(f"[WARN] Skipping bad pattern {p!r} for intent '{name}': {e}")
+        vocab[name] = set()
+        for example in spec.get("examples", []):
+            norm = _normalize(example)
+            vocab[name].update(norm.split())
+            vec = _trigrams(norm)
+            index.append((name, vec, sqrt(sum(v * v for v in vec.values()))))
+
+    with _tables_lock:
+        _tables[intents_file] = (intents, index, vocab)
+    return _tables[intents_file]
+
+
+def _table(intents_file: str = None):
+    table = _tables.get(intents_file)
+    return table if table is not None else load_intents(intents_file)
+
+
+def _in_vocab(word: str, vocab: set) -> bool:
+    if word in vocab:
+        return True
+    if len(word) < FUZZY_MIN_WORD:
+        return False
+    return any(within_one_edit(word, v) for v in vocab)
+
+
+def match_intent(question: str, intents_file: str = None):
+    """Return the matching intent name, or None if the question needs RAG."""
+    intents, index, vocab = _table(intents_file)
+
+    text = _normalize(question)
+    if not text or len(text.split()) > MAX_WORDS:
+        return None
+
+    for name, spec in intents.items():
+        if any(r.match(text) for r in spec["_regex"]):
+            return name
+
+    # Fuzzy matching only for messages whose every word is (within one typo)
+    # one of the intent's example words, so "helo" can match "hello" but
+    # "what are you offering" never looks like "what are you"
+    words = set(text.split())
+    vec = _trigrams(text)
+    norm = sqrt(sum(v * v for v in vec.values()))
+    best_name, best_score = None, 0.0
+    for name, ex_vec, ex_norm in index:
+        if not all(_in_vocab(w, vocab[name]) for w in words):
+            continue
+        dot = sum(c * ex_vec[g] for g, c in vec.items() if g in ex_vec)
+        score = dot / (norm * ex_norm) if norm and ex_norm else 0.0
+        if score > best_score:
+            best_name, best_score = name, score
+
+    return best_name if best_score >= MATCH_THRESHOLD else None
+
+
+def route(question: str, intents_file: str = None, use_builtin: bool = True):
+    """
+    Answer small-talk and configured intents without retrieval or LLM.
+    `intents_file` selects a tenant's own intents instead of the built-ins;
+    with neither, the question is only counted so fast_path_ratio covers all traffic.
+    Returns a result dict like generate_answer(), or None to fall through.
+    """
+    name = None
+    if intents_file or use_builtin:
+        name = match_intent(question, intents_file)
+    with _stats_lock:
+        _stats["total"] += 1
+        if name is not None:
+            _stats["fast_path"] += 1
+            _stats[f"intent:{name}"] += 1
+
+    if name is None:
+        return None
+    spec = _table(intents_file)[0][name]
+    return {"answer": spec["answer"], "sources": spec.get("sources", []), "intent": name}
+
+
+def get_stats():
+    """Return routing counters and the share of traffic served by the fast path."""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats.get("total", 0)
+    stats["fast_path_ratio"] = round(stats.get("fast_path", 0) / total, 4) if total else 0.0
+    return stats
@@ -1,8 +1,14 @@
-import json
+import argparse
+import os
 from pathlib import Path
-
-INPUT_FILE = "crawled_pages.jsonl"
-OUTPUT_FILE = "chunks.jsonl"
+from profiling import maybe_profile
+from chunk_store import ChunkStoreWriter, iter_records
+from tenants import DEFAULT_TENANT, tenant_settings
+
+# File names are relative to the tenant's data_dir (see tenants.py)
+INPUT_FILE = "crawled_pages.store"
+LEGACY_INPUT_FILE = "crawled_pages.jsonl"  # Read if INPUT_FILE does not exist yet
+OUTPUT_FILE = "chunks.store"
 CHUNK_SIZE = 400  # words per chunk
 
 
@@ -12,30 +18,39 @@ def chunk_text(text, chunk_size=CHUNK_SIZE):
         yield " ".join(words[i : i + chunk_size])
 
 
-def main():
-    input_path = Path(INPUT_FILE)
-    if not input_path.exists():
-        print(f"ERROR: {INPUT_FILE} not found.")
+def main(input_file=INPUT_FILE, output_file=OUTPUT_FILE, legacy_input_file=LEGACY_INPUT_FILE):
+    if not Path(input_file).exists() and not Path(legacy_input_file).exists():
+        print(f"ERROR: {input_file} not found.")
         return
 
-    chunks = []
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            data = json.loads(line)
+    # Chunks are streamed into the store instead of being held in memory
+    with ChunkStoreWriter(output_file, overwrite=True) as writer:
+        for data in iter_records(input_file, legacy_input_file):
             url = data.get("url", "")
             text = data.get("text", "").strip()
             if len(text) < 50:
                 continue
             for c in chunk_text(text):
-                chunks.append({"url": url, "text": c})
-
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        for c in chunks:
-            json.dump(c, f, ensure_ascii=False)
-            f.write("\n")
+                writer.append(c, url, data.get("heading", ""))
+        count = len(writer)
 
-    print(f"[DONE] Created {len(chunks)} chunks -> {OUTPUT_FILE}")
+    print(f"[DONE] Created {count} chunks -> {output_file}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chunk a tenant's crawled pages.")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="Tenant key from tenants.json")
+    parser.add_argument("--input", help=f"Crawled pages store (default: <data_dir>/{INPUT_FILE})")
+    parser.add_argument("--output", help=f"Chunk store to write (default: <data_dir>/{OUTPUT_FILE})")
+    args = parser.parse_args()
+    try:
+        data_dir = tenant_settings(args.tenant)["data_dir"]
+    except ValueError as e:
+        parser.error(str(e))
+
+    with maybe_profile("preprocess_texts", always=True):
+        main(
+            args.input or os.path.join(data_dir, INPUT_FILE),
+            args.output or os.path.join(data_dir, OUTPUT_FILE),
+            os.path.join(data_dir, LEGACY_INPUT_FILE),
+        )
@@ -0,0 +1,121 @@
+import hmac
+import os
+import random
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Sampling profiler; profiling stays off without it rather than falling back
+# to a tracing profiler whose overhead would distort the request path
+try:
+    from pyinstrument import Profiler
+
+    PYINSTRUMENT_AVAILABLE = True
+except ImportError:
+    PYINSTRUMENT_AVAILABLE = False
+
+load_dotenv()
+
+# ---------------- CONFIG ----------------
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 0.01 = 1% of requests
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")  # Sent as X-Profile-Token to force a profile
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = 0.001  # Sampling interval in seconds
+PROFILE_KEEP = 50  # Most recent profiles kept on disk
+
+if PROFILE_ENABLED and not PYINSTRUMENT_AVAILABLE:
+    print("[WARN] PROFILE_ENABLED is set but pyinstrument is not installed; profiling disabled.")
+    print("[INFO] Install it: pip install pyinstrument")
+
+
+def token_valid(token) -> bool:
+    """Constant-time check of a client-supplied profiling token."""
+    if not PROFILE_TOKEN or not token:
+        return False
+    return hmac.compare_digest(str(token), PROFILE_TOKEN)
+
+
+def should_profile(token=None, always: bool = False) -> bool:
+    """Profile when enabled and either forced, authorized by token, or sampled."""
+    if not PROFILE_ENABLED or not PYINSTRUMENT_AVAILABLE:
+        return False
+    if always or token_valid(token):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def maybe_profile(name: str, token=None, always: bool = False):
+    """
+    Wrap a block in a wall-time sampling profiler if should_profile() says so.
+    Profiles are written to PROFILE_DIR as speedscope JSON (or HTML).
+    A profiler that fails to start never fails the wrapped block.
+    """
+    if not should_profile(token, always):
+        yield
+        return
+
+    try:
+        profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="disabled")
+        profiler.start()
+    except Exception as e:
+        print(f"[WARN] Could not start profiler for '{name}', running unprofiled: {e}")
+        yield
+        return
+
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        try:
+            profiler.stop()
+            path = _write_profile(profiler, name, elapsed_ms)
+            print(f"[INFO] Profile written: {path}")
+        except Exception as e:
+            print(f"[WARN] Could not save profile for '{name}': {e}")
+
+
+def _write_profile(profiler, name: str, elapsed_ms: float) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{name}-{elapsed_ms:.0f}ms"
+    base = os.path.join(PROFILE_DIR, stem)
+
+    try:
+        from pyinstrument.renderers import SpeedscopeRenderer
+
+        path = f"{base}.speedscope.json"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.output(renderer=SpeedscopeRenderer()))
+    except ImportError:
+        path = f"{base}.html"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+
+    _prune_profiles()
+    return path
+
+
+def _prune_profiles():
+    for entry in list_profiles(limit=None)[PROFILE_KEEP:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, entry["name"]))
+        except OSError:
+            pass
+
+
+def list_profiles(limit=20):
+    """Most recent profiles first, as dicts with name, size and mtime."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(PROFILE_DIR):
+        path = os.path.join(PROFILE_DIR, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append(
+                {"name": name, "size": stat.st_size, "mtime": round(stat.st_mtime, 3)}
+            )
+    entries.sort(key=lambda e: e["mtime"], reverse=True)
+    return entries if limit is None else entries[:limit]
@@ -0,0 +1,96 @@
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# ---------------- CONFIG ----------------
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "true").lower() == "true"
+QUERY_LOG_DIR = os.getenv("QUERY_LOG_DIR", "query_logs")
+BUFFER_SIZE = 10000  # Records held in memory; oldest dropped when full
+FLUSH_INTERVAL = 2.0  # Seconds between background flushes
+ROTATE_BYTES = 64 * 1024 * 1024  # Start a new file once the current one is this big
+
+# ---------------- GLOBALS ----------------
+# deque append/popleft are atomic, so the request path never takes a lock
+_buffer = deque(maxlen=BUFFER_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+_flush_lock = threading.Lock()  # Background thread and atexit may flush together
+_stats = {"logged": 0, "dropped": 0, "written": 0, "write_errors": 0}
+
+
+def log_query(record: dict):
+    """Queue a record for the background writer. Never blocks or raises."""
+    if not QUERY_LOG_ENABLED:
+        return
+    if _writer is None:
+        _start_writer()
+    if len(_buffer) >= BUFFER_SIZE:
+        _stats["dropped"] += 1
+    record.setdefault("ts", time.time())
+    _buffer.append(record)
+    _stats["logged"] += 1
+
+
+def get_stats():
+    return {**_stats, "buffered": len(_buffer)}
+
+
+def _start_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            return
+        _writer = threading.Thread(target=_run, name="query-log-writer", daemon=True)
+        _writer.start()
+        atexit.register(flush)
+
+
+def _run():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+def _current_path():
+    """Hourly files per process, with a numeric suffix once ROTATE_BYTES is hit."""
+    stem = f"queries-{time.strftime('%Y%m%d-%H')}-{os.getpid()}"
+    part = 0
+    while True:
+        path = os.path.join(QUERY_LOG_DIR, f"{stem}-{part}.jsonl.gz")
+        if not os.path.exists(path) or os.path.getsize(path) < ROTATE_BYTES:
+            return path
+        part += 1
+
+
+def flush():
+    """Drain the buffer into the current compressed JSONL file."""
+    with _flush_lock:
+        _flush()
+
+
+def _flush():
+    batch = []
+    while _buffer:
+        try:
+            batch.append(_buffer.popleft())
+        except IndexError:
+            break
+    if not batch:
+        return
+
+    lines = "".join(
+        json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in batch
+    )
+    try:
+        os.makedirs(QUERY_LOG_DIR, exist_ok=True)
+        # Each flush appends a gzip member; gzip readers handle multi-member files
+        with gzip.open(_current_path(), "at", encoding="utf-8") as f:
+            f.write(lines)
+        _stats["written"] += len(batch)
+    except Exception as e:
+        _stats["write_errors"] += 1
+        print(f"[WARN] Query log write failed, {len(batch)} records dropped: {e}")
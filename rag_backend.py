@@ -7,51 +7,77 @@
 # version 1 for deployment
 
 import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import chromadb
 from chromadb.config import Settings
 from openai import OpenAI
+from intent_router import route
+from index_versions import read_current, list_versions, KEEP_VERSIONS
+from chunk_store import ChunkStore
+from profiling import maybe_profile
+from preprocess_texts import CHUNK_SIZE
+from tenants import DEFAULT_TENANT, read_tenants_file
 
 # Load environment variables
 load_dotenv()
 
 # ---------------- CONFIG ----------------
 PERSIST_DIR = "chroma_db"
-CHROMA_COLLECTION = "ismt_docs"
+CHROMA_COLLECTION = "ismt_docs"  # Base name; live version read from its pointer file
+INDEX_CHECK_INTERVAL = 5  # Seconds between checks for a newly published index
 TOP_K = 2  # Number of documents to retrieve
 
+# Multi-tenant serving: each tenant (campus/department) has its own index and
+# may override top_k, system_prompt, model and intents_file. Tenants are read
+# from TENANTS_FILE (see tenants.py); missing fields fall back to the defaults above.
+MAX_LOADED_INDEXES = int(os.getenv("MAX_LOADED_INDEXES", "4"))  # LRU cap on open indexes
+
+# Optional cross-encoder reranking (needs sentence-transformers, CPU only)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 20  # First-stage candidates pulled from ChromaDB
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+
 # Groq API Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_BASE_URL = "https://api.groq.com/openai/v1"
 GROQ_MODEL = "llama-3.1-8b-instant"
+SYSTEM_PROMPT = (
+    "You are a helpful assistant of ISMT College. "
+    "Answer user questions concisely, politely, and base your answer only on the provided context."
+)
 
 # ---------------- GLOBALS ----------------
-client = None
-collection = None
 groq_client = None
+reranker = None
+tenants = {}  # Tenant key -> config dict
 _components_initialized = False
 llm_available = False
+_rerank_ms_per_doc = 0.0  # Running estimate of rerank cost per candidate
+_rerank_lock = threading.Lock()
+_indexes = OrderedDict()  # Tenant key -> TenantIndex, least recently used first
+_registry_lock = threading.Lock()
+# persist_dir -> open TenantIndex objects using it, registered or evicted but
+# still serving requests. Chroma shares one system per directory, so it is
+# only stopped when this drops to zero.
+_dir_users = Counter()
 
 
 # ---------------- INITIALIZATION ----------------
 def initialize_components():
-    """Initialize ChromaDB and Groq API client."""
-    global client, collection, groq_client, _components_initialized, llm_available
+    """Load tenant configs and initialize the Groq API client and reranker.
+    Tenant indexes are opened lazily by get_index()."""
+    global groq_client, reranker, tenants, _components_initialized, llm_available
 
     if _components_initialized:
         return
 
-    # Connect to ChromaDB
-    print(f"[INFO] Connecting to ChromaDB at '{PERSIST_DIR}' ...")
-    client = chromadb.PersistentClient(path=PERSIST_DIR)
-    try:
-        collection = client.get_collection(CHROMA_COLLECTION)
-        print(
-            f"[OK] Found collection '{CHROMA_COLLECTION}' with {collection.count()} items."
-        )
-    except Exception:
-        print(f"[WARN] Collection '{CHROMA_COLLECTION}' not found, creating a new one.")
-        collection = client.create_collection(CHROMA_COLLECTION)
+    tenants = load_tenants()
+    print(f"[INFO] Serving tenants: {', '.join(tenants)}")
 
     # Initialize Groq API client
     print("[INFO] Initializing Groq API client...")
@@ -69,33 +95,413 @@ def initialize_components():
             groq_client = None
             llm_available = False
 
+    if RERANK_ENABLED:
+        reranker = load_reranker()
+
     _components_initialized = True
 
 
+def load_tenants():
+    """Default tenant plus any tenants defined in TENANTS_FILE."""
+    defaults = {
+        "persist_dir": PERSIST_DIR,
+        "collection": CHROMA_COLLECTION,
+        "top_k": TOP_K,
+        "system_prompt": SYSTEM_PROMPT,
+        "model": GROQ_MODEL,
+    }
+    configs = {DEFAULT_TENANT: dict(defaults)}
+    for key, overrides in read_tenants_file().items():
+        configs[key] = {**defaults, **overrides}
+    return configs
+
+
+def list_tenants():
+    initialize_components()
+    return list(tenants)
+
+
+def tenant_config(tenant: str = None) -> dict:
+    initialize_components()
+    return tenants[tenant or DEFAULT_TENANT]
+
+
+def get_index(tenant: str = None):
+    """
+    Return the open index for a tenant, opening it on first use.
+    At most MAX_LOADED_INDEXES stay open; the least recently used is evicted
+    and released once no request is using it. Callers that query the index
+    should go through use_index() so eviction waits for them.
+    """
+    key = tenant or DEFAULT_TENANT
+    config = tenant_config(key)
+
+    with _registry_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    # Open outside the registry lock so a slow open doesn't block other tenants.
+    # Counted as a user first so a concurrent release can't stop the shared
+    # Chroma system this client is about to attach to.
+    persist_dir = config["persist_dir"]
+    with _registry_lock:
+        _dir_users[persist_dir] += 1
+    try:
+        index = TenantIndex(key, config)
+    except Exception:
+        with _registry_lock:
+            _dir_users[persist_dir] -= 1
+        raise
+
+    retired = []
+    with _registry_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            duplicate, index = index, _indexes[key]
+            duplicate.evicted = True
+            _retire(duplicate, retired)
+        else:
+            _indexes[key] = index
+            while len(_indexes) > MAX_LOADED_INDEXES:
+                _, evicted = _indexes.popitem(last=False)
+                evicted.evicted = True
+                print(f"[INFO] Evicted cold index for tenant '{evicted.tenant}'")
+                _retire(evicted, retired)
+    _close_retired(retired)
+    return index
+
+
+@contextmanager
+def use_index(tenant: str = None):
+    """Hold a tenant's index for the duration of a request."""
+    while True:
+        index = get_index(tenant)
+        with _registry_lock:
+            # Evicted between lookup and hold: look it up again
+            if not index.evicted:
+                index.active += 1
+                break
+    try:
+        yield index
+    finally:
+        retired = []
+        with _registry_lock:
+            index.active -= 1
+            if index.evicted:
+                _retire(index, retired)
+        _close_retired(retired)
+
+
+def _retire(index, retired: list):
+    """
+    Mark an unregistered index closed once its last request is done and queue
+    it on `retired`. When it was the last user of its persist_dir, its Chroma
+    system is taken out of the shared cache here, so a client opened after
+    this point gets a fresh one. Call with _registry_lock held.
+    """
+    if index.active or index.closed:
+        return
+    index.closed = True
+    _dir_users[index.persist_dir] -= 1
+    system = None
+    if _dir_users[index.persist_dir] <= 0:
+        del _dir_users[index.persist_dir]
+        system = index.detach_system()
+    retired.append((index, system))
+
+
+def _close_retired(retired: list):
+    """Close retired indexes outside _registry_lock; stopping Chroma can be slow."""
+    for index, system in retired:
+        index.close(system)
+
+
+def load_reranker():
+    """Load a quantized CPU cross-encoder, or None if it is unavailable."""
+    print(f"[INFO] Loading reranker: {RERANK_MODEL} ...")
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError:
+        print("[WARN] sentence-transformers not installed, reranking disabled.")
+        return None
+
+    try:
+        model = CrossEncoder(RERANK_MODEL, device="cpu")
+    except Exception as e:
+        print(f"[WARN] Could not load reranker, reranking disabled: {e}")
+        return None
+
+    # Dynamic int8 quantization of the linear layers roughly halves CPU latency
+    try:
+        import torch
+
+        model.model = torch.quantization.quantize_dynamic(
+            model.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        print("[OK] Reranker loaded (int8 quantized).")
+    except Exception as e:
+        print(f"[WARN] Reranker quantization skipped: {e}")
+
+    # Warm up so the first request doesn't pay for lazy init, and seed the
+    # per-candidate cost estimate from a full-size batch of chunk-sized
+    # passages (CHUNK_SIZE words, truncated to the model's max length like real ones)
+    try:
+        passage = " ".join(["campus admission fee program"] * (CHUNK_SIZE // 4))
+        pairs = [("what are the admission requirements", passage)] * RERANK_CANDIDATES
+        model.predict(pairs, batch_size=len(pairs))
+        t0 = time.perf_counter()
+        model.predict(pairs, batch_size=len(pairs))
+        _update_rerank_estimate((time.perf_counter() - t0) * 1000 / len(pairs))
+        print(f"[OK] Reranker warmed up ({_rerank_ms_per_doc:.2f} ms per candidate).")
+    except Exception as e:
+        print(f"[WARN] Could not load reranker, reranking disabled: {e}")
+        return None
+    return model
+
+
+def _update_rerank_estimate(per_doc_ms: float):
+    global _rerank_ms_per_doc
+    with _rerank_lock:
+        if _rerank_ms_per_doc:
+            _rerank_ms_per_doc = 0.8 * _rerank_ms_per_doc + 0.2 * per_doc_ms
+        else:
+            _rerank_ms_per_doc = per_doc_ms
+
+
+class TenantIndex:
+    """One tenant's ChromaDB collection, hot-swapped when a new version is published."""
+
+    def __init__(self, tenant: str, config: dict):
+        self.tenant = tenant
+        self.persist_dir = config["persist_dir"]
+        self.base = config["collection"]
+        self.lock = threading.Lock()
+        self.store_lock = threading.Lock()
+        self.chunk_stores = {}  # Collection name -> ChunkStore holding its texts (or None)
+        self.active = 0  # Requests using this index; guarded by _registry_lock
+        self.evicted = False
+        self.closed = False
+
+        # Connect to ChromaDB
+        print(f"[INFO] Connecting to ChromaDB at '{self.persist_dir}' ...")
+        self.client = chromadb.PersistentClient(path=self.persist_dir)
+        name, self.mtime = read_current(self.persist_dir, self.base)
+        self.checked_at = time.monotonic()
+        try:
+            self.collection = self.client.get_collection(name)
+        except Exception:
+            self.collection = self._fallback_collection(name)
+        print(f"[OK] Found collection '{self.collection.name}' with {self.collection.count()} items.")
+        # Fail at startup rather than serve chunks without text
+        self.chunk_store_for(self.collection)
+
+    def _fallback_collection(self, missing: str):
+        """
+        The pointer names a version that no longer exists: serve the newest
+        remaining version rather than an empty collection.
+        """
+        versions = list_versions(self.client, self.base)
+        if versions:
+            print(f"[WARN] Index version '{missing}' not found, using '{versions[-1]}'.")
+            return self.client.get_collection(versions[-1])
+        if self.mtime is not None:
+            raise RuntimeError(
+                f"Index pointer for '{self.base}' names missing version '{missing}' "
+                f"and no other versions exist in '{self.persist_dir}'"
+            )
+        print(f"[WARN] Collection '{self.base}' not found, creating a new one.")
+        return self.client.create_collection(self.base)
+
+    def refresh(self, force: bool = False):
+        """
+        Switch to a newly published index version without restarting.
+        In-flight queries keep the collection object they already hold.
+        """
+        now = time.monotonic()
+        if not force and now - self.checked_at < INDEX_CHECK_INTERVAL:
+            return self.collection
+
+        with self.lock:
+            self.checked_at = now
+            name, mtime = read_current(self.persist_dir, self.base)
+            if mtime == self.mtime and not force:
+                return self.collection
+            try:
+                new_collection = self.client.get_collection(name)
+                # Refuse a version whose chunk texts can't be served
+                self.chunk_store_for(new_collection)
+            except Exception as e:
+                print(f"[WARN] Could not open index version '{name}': {e}")
+                return self.collection
+            if new_collection.name != self.collection.name:
+                print(f"[OK] Switched to index version '{name}'")
+            self.collection = new_collection
+            self.mtime = mtime
+        return self.collection
+
+    def query(self, query: str, n_results: int):
+        """Vector search on the live version, retrying once if it was collected."""
+        coll = self.refresh()
+        try:
+            return query_collection(coll, self.chunk_store_for(coll), query, n_results)
+        except Exception:
+            # The version may have been garbage collected under us; retry on the live one
+            retry = self.refresh(force=True)
+            if retry.name == coll.name:
+                raise
+            return query_collection(retry, self.chunk_store_for(retry), query, n_results)
+
+    def chunk_store_for(self, coll):
+        """
+        Open (once) the chunk store recorded in a collection's metadata.
+        Its path is relative to persist_dir. Raises if the store can't be
+        opened: such a version has no texts in Chroma to fall back on.
+        """
+        name = coll.name
+        if name in self.chunk_stores:
+            return self.chunk_stores[name]
+
+        with self.store_lock:
+            if name not in self.chunk_stores:
+                path = (coll.metadata or {}).get("chunk_store")
+                store = None
+                if path:
+                    path = os.path.join(self.persist_dir, path)
+                    try:
+                        store = ChunkStore(path)
+                    except Exception as e:
+                        raise RuntimeError(
+                            f"Chunk store '{path}' for index version '{name}' cannot be opened: {e}"
+                        ) from e
+                    print(f"[OK] Opened chunk store '{path}' with {len(store)} chunks.")
+                # Only the live and previous versions can still be queried. A
+                # dropped store is released once in-flight queries let go of it
+                # (ChunkStore has no reference cycle), so it isn't closed here.
+                while len(self.chunk_stores) >= KEEP_VERSIONS:
+                    self.chunk_stores.pop(next(iter(self.chunk_stores)))
+                self.chunk_stores[name] = store
+        return self.chunk_stores[name]
+
+    def detach_system(self):
+        """Remove this client's system from chromadb's shared-system cache and return it."""
+        try:
+            return type(self.client)._identifier_to_system.pop(self.client._identifier, None)
+        except Exception as e:
+            print(f"[WARN] Could not release ChromaDB client for tenant '{self.tenant}': {e}")
+            return None
+
+    def close(self, system=None):
+        """
+        Close the chunk stores and stop a detached Chroma system, so its
+        segments and HNSW indexes are freed rather than kept alive by the cache.
+        """
+        with self.store_lock:
+            for store in self.chunk_stores.values():
+                if store is not None:
+                    store.close()
+            self.chunk_stores.clear()
+        if system is None:
+            return
+        try:
+            system.stop()
+        except Exception as e:
+            print(f"[WARN] Could not stop ChromaDB client for tenant '{self.tenant}': {e}")
+
+
 # ---------------- RETRIEVAL ----------------
-def retrieve(query: str, top_k: int = TOP_K):
+def retrieve(query: str, top_k: int = None, timings: dict = None, tenant: str = None):
     """
-    Retrieve top-k relevant documents from ChromaDB.
+    Retrieve top-k relevant documents from the tenant's ChromaDB collection.
     Uses pre-generated embeddings, no SentenceTransformer required.
+    When a reranker is loaded, a larger candidate set is fetched and
+    reordered by the cross-encoder. Stage timings (ms) go into `timings`.
     """
     initialize_components()
+    if timings is None:
+        timings = {}
+    if top_k is None:
+        top_k = tenant_config(tenant)["top_k"]
+
+    n_results = max(top_k, RERANK_CANDIDATES) if reranker is not None else top_k
+
+    t0 = time.perf_counter()
+    with use_index(tenant) as index:
+        candidates = index.query(query, n_results)
+    timings["search_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+
+    if reranker is not None and len(candidates) > top_k:
+        candidates = rerank(query, candidates, timings)
+
+    return candidates[:top_k]
+
+
+def query_collection(coll, store, query: str, n_results: int):
+    """
+    Run the vector search on one collection version. When the version has a
+    chunk store, Chroma returns only ids and texts and metadata are read from it.
+    """
+    include = [] if store is not None else ["documents", "metadatas"]
 
     # Chroma can accept raw text queries with precomputed embeddings
-    results = collection.query(
-        query_texts=[query], n_results=top_k, include=["documents", "metadatas"]
-    )
+    results = coll.query(query_texts=[query], n_results=n_results, include=include)
+
+    ids = results.get("ids", [[]])[0]
+    if store is not None:
+        docs = [store.text(int(i)) for i in ids]
+        metas = [store.meta(int(i)) for i in ids]
+    else:
+        docs = results.get("documents", [[]])[0]
+        metas = results.get("metadatas", [[]])[0]
+    # Hits without text are dropped rather than handed to the LLM as empty context
+    return [
+        {"id": i, "text": d, "meta": m or {}}
+        for i, d, m in zip(ids, docs, metas)
+        if d
+    ]
+
+
+def rerank(query: str, candidates: list, timings: dict):
+    """
+    Reorder candidates with the cross-encoder in a single batched pass.
+    Only the largest prefix of the first-stage ranking that fits in
+    RERANK_BUDGET_MS is reranked; the rest keep their vector order.
+    """
+    with _rerank_lock:
+        per_doc = _rerank_ms_per_doc
+    n_fit = int(RERANK_BUDGET_MS / per_doc) if per_doc else len(candidates)
+    n_fit = min(n_fit, len(candidates))
+    if n_fit < 2:
+        timings["rerank_ms"] = 0.0
+        timings["rerank_skipped"] = True
+        return candidates
+
+    head, tail = candidates[:n_fit], candidates[n_fit:]
+    t0 = time.perf_counter()
+    try:
+        pairs = [(query, c["text"]) for c in head]
+        scores = reranker.predict(pairs, batch_size=len(pairs))
+    except Exception as e:
+        print(f"[WARN] Reranking failed, using vector order: {e}")
+        timings["rerank_skipped"] = True
+        return candidates
+    elapsed_ms = (time.perf_counter() - t0) * 1000
 
-    docs = results.get("documents", [[]])[0]
-    metas = results.get("metadatas", [[]])[0]
+    _update_rerank_estimate(elapsed_ms / len(head))
+    timings["rerank_ms"] = round(elapsed_ms, 2)
+    timings["rerank_candidates"] = len(head)
+    timings["rerank_skipped"] = False
 
-    return [{"text": d, "meta": m} for d, m in zip(docs, metas)]
+    order = sorted(range(len(head)), key=lambda i: scores[i], reverse=True)
+    return [head[i] for i in order] + tail
 
 
 # ---------------- PROMPT BUILDER ----------------
-def build_prompt(question, retrieved):
+def build_prompt(question, retrieved, top_k: int = TOP_K):
     """Build prompt text with retrieved context for Groq API."""
     context_blocks = []
-    for r in retrieved[:TOP_K]:
+    for r in retrieved[:top_k]:
         url = r["meta"].get("url", "unknown")
         text = r["text"].strip()
         if len(text) > 200:
@@ -106,7 +512,12 @@ def build_prompt(question, retrieved):
 
 
 # ---------------- GROQ API CALL ----------------
-def call_groq_api(user_query: str, context_text: str) -> str:
+def call_groq_api(
+    user_query: str,
+    context_text: str,
+    model: str = GROQ_MODEL,
+    system_prompt: str = SYSTEM_PROMPT,
+) -> str:
     """Generate a response using Groq Cloud API."""
     initialize_components()
 
@@ -115,15 +526,9 @@ def call_groq_api(user_query: str, context_text: str) -> str:
 
     try:
         response = groq_client.chat.completions.create(
-            model=GROQ_MODEL,
+            model=model,
             messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful assistant of ISMT College. "
-                        "Answer user questions concisely, politely, and base your answer only on the provided context."
-                    ),
-                },
+                {"role": "system", "content": system_prompt},
                 {
                     "role": "user",
                     "content": f"Context:\n{context_text}\n\nQuestion: {user_query}",
@@ -142,16 +547,35 @@ def call_groq_api(user_query: str, context_text: str) -> str:
 
 
 # ---------------- MAIN PIPELINE ----------------
-def generate_answer(question: str, use_llm: bool = True):
+def generate_answer(question: str, use_llm: bool = True, tenant: str = None):
     """
     Retrieve context from ChromaDB and generate answer using Groq API.
     If use_llm=False, only returns retrieved text.
+    `tenant` selects the collection and per-tenant settings (default tenant if None).
     """
-    retrieved = retrieve(question)
+    config = tenant_config(tenant)
+    timings = {}
+    t_start = time.perf_counter()
+
+    # Greetings and canned questions skip retrieval and the LLM entirely.
+    # The built-in intents answer as ISMT, so other tenants are only routed
+    # when they configure their own "intents_file".
+    routed = route(
+        question,
+        config.get("intents_file"),
+        use_builtin=(tenant or DEFAULT_TENANT) == DEFAULT_TENANT,
+    )
+    if routed is not None:
+        timings["total_ms"] = round((time.perf_counter() - t_start) * 1000, 3)
+        routed["timings"] = timings
+        return routed
+
+    retrieved = retrieve(question, timings=timings, tenant=tenant)
     if not retrieved:
         return {
             "answer": "I could not find relevant information in ISMT resources.",
             "sources": [],
+            "timings": timings,
         }
 
     sources = [
@@ -159,23 +583,37 @@ def generate_answer(question: str, use_llm: bool = True):
         for r in retrieved
         if r["meta"].get("url")
     ]
+    chunk_ids = [r["id"] for r in retrieved]
 
     if not use_llm:
         # Return raw retrieval results
         context = "\n".join(
             [
                 f"[{r['meta'].get('url', 'unknown')}] {r['text'][:200]}..."
-                for r in retrieved[:TOP_K]
+                for r in retrieved[: config["top_k"]]
             ]
         )
+        timings["total_ms"] = round((time.perf_counter() - t_start) * 1000, 2)
         return {
             "answer": f"📋 Retrieved information:\n\n{context}\n\n(LLM disabled)",
             "sources": sources,
+            "chunk_ids": chunk_ids,
+            "timings": timings,
         }
 
-    context_text = build_prompt(question, retrieved)
-    answer = call_groq_api(question, context_text)
-    return {"answer": answer, "sources": sources}
+    context_text = build_prompt(question, retrieved, config["top_k"])
+    t0 = time.perf_counter()
+    answer = call_groq_api(
+        question, context_text, config["model"], config["system_prompt"]
+    )
+    timings["llm_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    timings["total_ms"] = round((time.perf_counter() - t_start) * 1000, 2)
+    return {
+        "answer": answer,
+        "sources": sources,
+        "chunk_ids": chunk_ids,
+        "timings": timings,
+    }
 
 
 # ---------------- CLI TEST ----------------
@@ -185,9 +623,11 @@ if __name__ == "__main__":
         q = input("You: ")
         if q.lower() in ["exit", "quit"]:
             break
-        res = generate_answer(q)
+        with maybe_profile("cli", always=True):
+            res = generate_answer(q)
         print("\nAnswer:", res["answer"])
-        print("Sources:", ", ".join(res["sources"]), "\n")
+        print("Sources:", ", ".join(res["sources"]))
+        print("Timings:", res.get("timings", {}), "\n")
 
 
 # version 2 to run locally
@@ -130,6 +130,52 @@ function createTypingIndicator() {
   return wrap; // return element to remove later
 }
 
+// Question autocomplete (debounced, shown via a <datalist> on the input)
+const suggestionList = document.createElement("datalist");
+suggestionList.id = "question-suggestions";
+document.body.appendChild(suggestionList);
+input.setAttribute("list", suggestionList.id);
+input.setAttribute("autocomplete", "off");
+
+let suggestTimer = null;
+let suggestController = null;
+
+// Drop pending and in-flight lookups so they can't refill the list later
+function cancelSuggestions() {
+  clearTimeout(suggestTimer);
+  if (suggestController) suggestController.abort();
+  suggestController = null;
+  suggestionList.innerHTML = "";
+}
+
+input.addEventListener("input", () => {
+  clearTimeout(suggestTimer);
+  const prefix = input.value.trim();
+  if (prefix.length < 2) {
+    cancelSuggestions();
+    return;
+  }
+  suggestTimer = setTimeout(async () => {
+    // Cancel the previous request so stale suggestions never overwrite newer ones
+    if (suggestController) suggestController.abort();
+    suggestController = new AbortController();
+    try {
+      const res = await fetch(`/api/suggest?q=${encodeURIComponent(prefix)}`, {
+        signal: suggestController.signal,
+      });
+      const data = await res.json();
+      suggestionList.innerHTML = "";
+      (data.suggestions || []).forEach((text) => {
+        const option = document.createElement("option");
+        option.value = text;
+        suggestionList.appendChild(option);
+      });
+    } catch (err) {
+      // Suggestions are best-effort; ignore aborted or failed requests
+    }
+  }, 150);
+});
+
 // Handle form submission
 form.addEventListener("submit", async (e) => {
   e.preventDefault();
@@ -138,6 +184,7 @@ form.addEventListener("submit", async (e) => {
 
   appendMessage("user", q);
   input.value = "";
+  cancelSuggestions();
 
   // Show typing indicator
   const typingIndicator = createTypingIndicator();
@@ -0,0 +1,332 @@
+import argparse
+import bisect
+import glob
+import gzip
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from chunk_store import ChunkStore, exists as store_exists
+from query_log import QUERY_LOG_DIR
+from tenants import DEFAULT_TENANT
+
+# ---------------- CONFIG ----------------
+SUGGESTIONS_FILE = "suggestions.json"  # Curated questions: ["...", {"text": "...", "weight": 5}]
+HEADINGS_STORE = "crawled_pages.store"  # Page headings from the last crawl
+# Popular questions mined from the query logs. Nothing is suggested until a
+# reviewer sets "approved": true on it: [{"text", "count", "approved"}, ...]
+CANDIDATES_FILE = "suggestion_candidates.json"
+CURATED_WEIGHT = 10.0
+HEADING_WEIGHT = 1.0
+POPULAR_MIN_COUNT = 3  # Logged asks before a question becomes a candidate
+MAX_CANDIDATE_WORDS = 15
+MAX_CANDIDATE_CHARS = 150
+MINE_MAX_KEYS = 50000  # Distinct questions tracked while mining; rarest dropped beyond this
+REFRESH_INTERVAL = 30  # Seconds between checks of the source files for changes
+MIN_PREFIX = 2
+MAX_SUGGESTIONS = 8
+
+DEFAULT_SUGGESTIONS = [
+    "What programs does ISMT offer?",
+    "When does admission open?",
+    "What is the fee structure?",
+    "Where is ISMT located?",
+    "What are the admission requirements?",
+    "Tell me about the campus facilities",
+]
+
+
+def _normalize(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by at most one insert, delete, substitute or swap."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        if a[i + 1 :] == b[i + 1 :]:
+            return True
+        return a[i : i + 2] == b[i : i + 2][::-1] and a[i + 2 :] == b[i + 2 :]
+    if la > lb:
+        return a[i + 1 :] == b[i:]
+    return a[i:] == b[i + 1 :]
+
+
+class SuggestIndex:
+    """
+    Sorted-array prefix index. Every entry is indexed under each suffix that
+    starts at a word boundary, so "fee" matches "What is the fee structure?".
+    """
+
+    def __init__(self):
+        self.texts = []  # Entry id -> display text
+        self.weights = []  # Entry id -> ranking weight
+        self.ids = {}  # Normalized text -> entry id
+        self.keys = []  # Sorted normalized suffixes
+        self.key_ids = []  # Entry id for each key, parallel to self.keys
+        self.vocab = defaultdict(set)  # First letter -> words, for typo correction
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, text: str, weight: float = 1.0, new_only: bool = False):
+        """Insert an entry, or raise its weight if it exists (unless new_only)."""
+        norm = _normalize(text)
+        if len(norm) < MIN_PREFIX:
+            return
+        with self.lock:
+            entry = self.ids.get(norm)
+            if entry is not None:
+                if not new_only:
+                    self.weights[entry] += weight
+                return
+            entry = len(self.texts)
+            self.ids[norm] = entry
+            self.texts.append(text.strip())
+            self.weights.append(weight)
+            words = norm.split()
+            for i, word in enumerate(words):
+                key = " ".join(words[i:])
+                pos = bisect.bisect_left(self.keys, key)
+                self.keys.insert(pos, key)
+                self.key_ids.insert(pos, entry)
+                self.vocab[word[0]].add(word)
+
+    def _lookup(self, prefix: str, limit: int):
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\uffff")
+        matches = {self.key_ids[i] for i in range(lo, hi)}
+        return heapq.nlargest(limit, matches, key=lambda e: self.weights[e])
+
+    def _corrections(self, word: str):
+        """Vocabulary words whose prefix is one edit away from a partial word."""
+        if len(word) < 3:
+            return []
+        n = len(word)
+        return [
+            w
+            for w in self.vocab.get(word[0], ())
+            if not w.startswith(word)
+            and any(within_one_edit(word, w[:k]) for k in (n - 1, n, n + 1))
+        ]
+
+    def suggest(self, prefix: str, limit: int = MAX_SUGGESTIONS):
+        """Top suggestions for a typed prefix, most frequent first."""
+        norm = _normalize(prefix)
+        if len(norm) < MIN_PREFIX:
+            return []
+        with self.lock:
+            found = self._lookup(norm, limit)
+            if not found:
+                # Fuzzy pass: retry with the last (partial) word corrected by one edit
+                head, _, last = norm.rpartition(" ")
+                for word in self._corrections(last):
+                    fixed = f"{head} {word}" if head else word
+                    for e in self._lookup(fixed, limit):
+                        if e not in found:
+                            found.append(e)
+                found = heapq.nlargest(limit, found, key=lambda e: self.weights[e])
+            return [self.texts[e] for e in found]
+
+
+# ---------------- GLOBALS ----------------
+_index = None
+_index_lock = threading.Lock()
+_mtimes = {}  # Source path -> mtime when last loaded
+_checked_at = 0.0
+
+
+def _curated_entries():
+    curated = DEFAULT_SUGGESTIONS
+    if os.path.exists(SUGGESTIONS_FILE):
+        try:
+            with open(SUGGESTIONS_FILE, "r", encoding="utf-8") as f:
+                curated = json.load(f)
+        except Exception as e:
+            print(f"[WARN] Could not load '{SUGGESTIONS_FILE}': {e}")
+    for item in curated:
+        if isinstance(item, dict):
+            yield item.get("text", ""), float(item.get("weight", CURATED_WEIGHT))
+        else:
+            yield item, CURATED_WEIGHT
+
+
+def _approved_entries():
+    for item in load_candidates():
+        if item.get("approved") is True:
+            yield item.get("text", ""), float(item.get("count", 1))
+
+
+def _heading_entries():
+    if not store_exists(HEADINGS_STORE):
+        return []
+    try:
+        store = ChunkStore(HEADINGS_STORE)
+        headings = list(store.dicts["heading"])
+        store.close()
+    except Exception as e:
+        print(f"[WARN] Could not read headings from '{HEADINGS_STORE}': {e}")
+        return []
+    return [(heading, HEADING_WEIGHT) for heading in headings]
+
+
+# Source file -> entry loader; the crawl store is replaced as a whole, so
+# its blocks.idx mtime changes on every new crawl
+SOURCES = {
+    SUGGESTIONS_FILE: _curated_entries,
+    CANDIDATES_FILE: _approved_entries,
+    os.path.join(HEADINGS_STORE, "blocks.idx"): _heading_entries,
+}
+
+
+def _mtime(path: str):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def build_index():
+    """Build the index from curated questions, approved popular questions and crawled page headings."""
+    index = SuggestIndex()
+    for path, entries in SOURCES.items():
+        _mtimes[path] = _mtime(path)
+        for text, weight in entries():
+            index.add(text, weight)
+    print(f"[OK] Suggestion index built with {len(index)} entries.")
+    return index
+
+
+def refresh_index(index):
+    """
+    Add entries from source files changed since they were last loaded, at most
+    every REFRESH_INTERVAL seconds. Only new entries are added; removing an
+    entry (e.g. a revoked approval) still needs a restart.
+    """
+    global _checked_at
+    now = time.monotonic()
+    if now - _checked_at < REFRESH_INTERVAL:
+        return
+    with _index_lock:
+        if now - _checked_at < REFRESH_INTERVAL:
+            return
+        _checked_at = now
+        for path, entries in SOURCES.items():
+            mtime = _mtime(path)
+            if mtime == _mtimes.get(path):
+                continue
+            _mtimes[path] = mtime
+            before = len(index)
+            for text, weight in entries():
+                index.add(text, weight, new_only=True)
+            print(f"[INFO] '{path}' changed, {len(index) - before} suggestions added.")
+
+
+def get_index():
+    global _index, _checked_at
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_index()
+                _checked_at = time.monotonic()
+    refresh_index(_index)
+    return _index
+
+
+def suggest(prefix: str, limit: int = MAX_SUGGESTIONS):
+    return get_index().suggest(prefix, limit)
+
+
+# ---------------- POPULAR QUESTIONS ----------------
+def load_candidates():
+    if not os.path.exists(CANDIDATES_FILE):
+        return []
+    try:
+        with open(CANDIDATES_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[WARN] Could not load '{CANDIDATES_FILE}': {e}")
+        return []
+
+
+def _is_candidate(record: dict) -> bool:
+    """Default-tenant questions that got a RAG answer with sources."""
+    if record.get("tenant") not in (None, DEFAULT_TENANT):
+        return False
+    if record.get("intent") or not record.get("sources"):
+        return False
+    question = (record.get("question") or "").strip()
+    if len(question) > MAX_CANDIDATE_CHARS:
+        return False
+    if not 2 <= len(question.split()) <= MAX_CANDIDATE_WORDS:
+        return False
+    # Links and markup are never suggested back to other users
+    return not re.search(r"https?://|www\.|[<>]", question, re.IGNORECASE)
+
+
+def mine_query_logs(log_dir: str = QUERY_LOG_DIR):
+    """Count candidate questions across every worker's query log files."""
+    counts = Counter()
+    texts = {}  # Normalized question -> first spelling seen
+    for path in sorted(glob.glob(os.path.join(log_dir, "*.jsonl.gz"))):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not _is_candidate(record):
+                        continue
+                    norm = _normalize(record["question"])
+                    counts[norm] += 1
+                    texts.setdefault(norm, record["question"].strip())
+                    if len(counts) > MINE_MAX_KEYS:
+                        for key, _ in counts.most_common()[MINE_MAX_KEYS // 2 :]:
+                            del counts[key]
+                            del texts[key]
+        except (OSError, EOFError) as e:
+            # The file a worker is still writing may end mid-member
+            print(f"[WARN] Stopped reading '{path}' early: {e}")
+    return [(texts[k], n) for k, n in counts.most_common() if n >= POPULAR_MIN_COUNT]
+
+
+def update_candidates(log_dir: str = QUERY_LOG_DIR):
+    """Refresh CANDIDATES_FILE from the logs, keeping earlier review decisions."""
+    previous = {_normalize(c.get("text", "")): c for c in load_candidates()}
+    candidates = []
+    for text, count in mine_query_logs(log_dir):
+        old = previous.pop(_normalize(text), {})
+        candidates.append(
+            {"text": old.get("text", text), "count": count, "approved": old.get("approved")}
+        )
+    # Reviewed entries no longer in the logs keep their decision
+    candidates.extend(c for c in previous.values() if c.get("approved") is not None)
+
+    tmp = f"{CANDIDATES_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(candidates, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, CANDIDATES_FILE)
+    unreviewed = sum(1 for c in candidates if c.get("approved") is None)
+    print(f"[DONE] {len(candidates)} candidates in {CANDIDATES_FILE}, {unreviewed} awaiting review.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mine popular questions from the query logs into suggestion candidates."
+    )
+    parser.add_argument("--log-dir", default=QUERY_LOG_DIR)
+    args = parser.parse_args()
+    update_candidates(args.log_dir)
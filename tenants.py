@@ -0,0 +1,36 @@
+import json
+import os
+
+# TENANTS_FILE maps tenant keys to per-tenant overrides, shared by serving
+# and the ingest scripts:
+#   serving    persist_dir, collection, top_k, system_prompt, model, intents_file
+#   ingest     root_url, data_dir, persist_dir, collection
+# data_dir holds a tenant's crawl output, checkpoint and chunks; it defaults
+# to the working directory for the default tenant and data/<tenant> otherwise.
+TENANTS_FILE = os.getenv("TENANTS_FILE", "tenants.json")
+DEFAULT_TENANT = "default"
+
+
+def read_tenants_file() -> dict:
+    """Tenant key -> overrides from TENANTS_FILE ({} if missing or unreadable)."""
+    if not os.path.exists(TENANTS_FILE):
+        return {}
+    try:
+        with open(TENANTS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[WARN] Could not load '{TENANTS_FILE}': {e}")
+        return {}
+
+
+def tenant_settings(tenant: str = None, defaults: dict = None) -> dict:
+    """
+    A tenant's overrides merged onto `defaults`, plus its data_dir.
+    Raises ValueError for a tenant not defined in TENANTS_FILE.
+    """
+    key = tenant or DEFAULT_TENANT
+    overrides = read_tenants_file()
+    if key != DEFAULT_TENANT and key not in overrides:
+        raise ValueError(f"Unknown tenant '{key}'; define it in '{TENANTS_FILE}'")
+    data_dir = "." if key == DEFAULT_TENANT else os.path.join("data", key)
+    return {"data_dir": data_dir, **(defaults or {}), **overrides.get(key, {})}